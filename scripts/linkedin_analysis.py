@@ -1,32 +1,117 @@
-import google.generativeai as genai
+import asyncio
 import json
-import base64
+import numpy as np
+import hashlib
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field, fields
+from functools import lru_cache
 from PIL import Image
 import io
 import os
 from datetime import datetime
+from pathlib import Path
+from typing import Optional
 from dotenv import load_dotenv
-import webbrowser
-load_dotenv()
+from jinja2 import Environment, FileSystemLoader, select_autoescape
+from markupsafe import Markup
+try:
+    import orjson
+except ImportError:
+    orjson = None
+try:
+    import ijson
+except ImportError:
+    ijson = None
+try:
+    import pybase64 as _b64
+except ImportError:
+    import base64 as _b64
 
-class InteractiveLinkedInAnalyzer:
-    def __init__(self, api_key):
-        """Initialize the analyzer with Gemini API key"""
-        genai.configure(api_key=api_key)
-        self.model = genai.GenerativeModel('gemini-2.0-flash')
-        
-    def encode_image_to_base64(self, image_path):
-        """Convert image to base64 for embedding in HTML"""
-        with open(image_path, "rb") as image_file:
-            image_data = image_file.read()
-            return base64.b64encode(image_data).decode('utf-8')
-    
-    def identify_section_coordinates(self, image_path):
-        """Identify exact coordinates of the first letter of section titles with enhanced precision"""
-        
-        image = Image.open(image_path)
-        
-        coordinate_prompt = """
+# Deployments that inject their environment directly can skip re-reading .env on import
+if not os.getenv('LINKEDIN_ANALYZER_SKIP_DOTENV'):
+    load_dotenv()
+
+# The Google SDK takes a noticeable time to import, so it is loaded on first use
+# rather than at module import; a missing API key then fails before paying for it
+@lru_cache(maxsize=None)
+def _get_genai():
+    """Import and return the google.generativeai module"""
+    import google.generativeai as genai
+    return genai
+
+@lru_cache(maxsize=None)
+def _get_google_exceptions():
+    """Import and return google.api_core.exceptions"""
+    from google.api_core import exceptions as google_exceptions
+    return google_exceptions
+
+@lru_cache(maxsize=None)
+def _retryable_errors():
+    """Transient Gemini failures (429 rate limits, 503s, timeouts) worth retrying"""
+    google_exceptions = _get_google_exceptions()
+    return (
+        google_exceptions.ResourceExhausted,
+        google_exceptions.ServiceUnavailable,
+        google_exceptions.DeadlineExceeded,
+    )
+
+# Screenshots are downscaled to fit this box before upload; Gemini bills images
+# per 768x768 tile, so full-resolution captures cost tokens without adding accuracy
+MAX_IMAGE_SIZE = (1536, 4096)
+UPLOAD_JPEG_QUALITY = 85
+REPORT_JPEG_QUALITY = 82
+# Source JPEGs that needed no downscaling and are at most this size are embedded as-is
+REPORT_PASSTHROUGH_MAX_BYTES = 512 * 1024
+# Decoded screenshots kept per analyzer; each holds the raw file, the upload JPEG
+# and a PIL image, so only the most recent few are worth keeping around
+PREPARED_IMAGE_CACHE_SIZE = 2
+# Longest wait between Gemini retries; the Node service kills the script after 60s,
+# so a longer server retry hint is treated as a failure rather than slept through
+MAX_RETRY_DELAY = 5.0
+
+# Bump whenever a prompt changes so cached Gemini results are invalidated
+PROMPT_VERSION = 2
+# Parsed results kept in memory on top of the on-disk cache
+RESULT_CACHE_MEMORY_ENTRIES = 128
+# Result files kept on disk; the least recently used are deleted beyond this
+RESULT_CACHE_DISK_ENTRIES = 1000
+DEFAULT_CACHE_DIR = os.getenv(
+    'LINKEDIN_ANALYZER_CACHE_DIR',
+    os.path.join(os.path.expanduser('~'), '.cache', 'linkedin_analyzer')
+)
+
+# JSON artifacts are machine-read, so they are written compact; set DEBUG_JSON
+# to get indented files for inspection
+JSON_ARTIFACT_KWARGS = (
+    {'indent': 2} if os.getenv('DEBUG_JSON')
+    else {'separators': (',', ':'), 'ensure_ascii': False}
+)
+
+def _json_loads(text):
+    """Parse JSON with orjson when available; its decode errors subclass json.JSONDecodeError"""
+    if orjson is not None:
+        return orjson.loads(text)
+    return json.loads(text)
+
+def _json_dumps(obj, indent=False):
+    """Serialize to a JSON str with orjson when available"""
+    if orjson is not None:
+        return orjson.dumps(obj, option=orjson.OPT_INDENT_2 if indent else 0).decode('utf-8')
+    return json.dumps(obj, indent=2 if indent else None)
+
+# Markdown code fence around a JSON payload, and the characters that matter
+# when scanning for the end of the top-level JSON object
+_JSON_FENCE_RE = re.compile(r"```(?:json)?\s*(.*?)```", re.S)
+_JSON_TOKEN_RE = re.compile(r'[{}"\\]')
+
+COORDINATE_PROMPT = """
         You are a computer vision expert specializing in precise text localization in LinkedIn profiles. Your task is to identify the EXACT pixel coordinates of the FIRST LETTER of each section title/header.
 
         CRITICAL INSTRUCTIONS:
@@ -101,248 +186,66 @@ class InteractiveLinkedInAnalyzer:
 
         Analyze the image carefully and provide the most accurate coordinates possible for placing interactive elements precisely on the first letter of each section title.
         """
-        
-        try:
-            response = self.model.generate_content([coordinate_prompt, image])
-            response_text = response.text
-            
-            # Extract JSON from response
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                json_text = response_text[json_start:json_end].strip()
-            else:
-                json_start = response_text.find("{")
-                json_end = response_text.rfind("}") + 1
-                json_text = response_text[json_start:json_end]
-            
-            coordinates = json.loads(json_text)
-            
-            # Post-process coordinates for better accuracy
-            if coordinates and coordinates.get('detected_sections'):
-                # Sort sections by vertical position (top to bottom)
-                coordinates['detected_sections'].sort(key=lambda x: x.get('title_coordinates', [0, 0])[1])
-                
-                # Add validation and adjustment logic
-                for section in coordinates['detected_sections']:
-                    coords = section.get('title_coordinates', [0, 0])
-                    
-                    # Ensure coordinates are within valid bounds
-                    coords[0] = max(0.0, min(100.0, coords[0]))
-                    coords[1] = max(0.0, min(100.0, coords[1]))
-                    
-                    # Adjust x-coordinate slightly left to account for any margin
-                    coords[0] = max(0.0, coords[0] - 0.5)
-                    
-                    section['title_coordinates'] = coords
-                    
-                    # Add precision metadata
-                    section['coordinate_precision'] = 'high' if section.get('confidence', 0) >= 85 else 'medium'
-            
-            return coordinates
-            
-        except json.JSONDecodeError as e:
-            print(f"JSON parsing error in coordinate detection: {e}")
-            print(f"Raw response: {response_text}")
-            return None
-            
-        except Exception as e:
-            print(f"Error in coordinate detection: {e}")
-            return None
-        
-    def analyze_profile(self, image_path, section_coordinates=None):
-        """Analyze LinkedIn profile screenshot using Gemini with coordinate context"""
-        
-        image = Image.open(image_path)
-        
-        # Build coordinate context for better analysis
-        coordinate_context = ""
-        if section_coordinates and section_coordinates.get('detected_sections'):
-            coordinate_context = f"""
-            DETECTED SECTION COORDINATES (for reference):
-            {json.dumps(section_coordinates['detected_sections'], indent=2)}
-            
-            Use these coordinates to provide more accurate bounding boxes for your analysis.
-            """
-        
-        # Updated prompt with coordinate awareness
-        prompt = f"""
-        You are an expert LinkedIn profile optimization consultant with 15+ years of experience. Analyze this LinkedIn profile screenshot with extreme precision and provide comprehensive feedback.
-
-        {coordinate_context}
-
-        CRITICAL ANALYSIS REQUIREMENTS:
-        1. Examine EVERY visible element in the profile screenshot
-        2. Use the detected section coordinates above to provide accurate positioning
-        3. Apply STRICT professional standards - be harsh but constructive
-        4. Focus on conversion optimization and professional branding impact
-
-        MANDATORY SECTIONS TO ANALYZE (if visible):
-        - Profile photo (Professional quality, lighting, attire, background, facial expression)
-        - Background banner (Brand consistency, visual appeal, message clarity)
-        - Headline/title (Keyword optimization, value proposition, character count)
-        - Summary/About section (Storytelling, achievements, call-to-action, length)
-        - Experience entries (Impact metrics, keyword density, accomplishment focus)
-        - Education (Relevance, completeness, additional credentials)
-        - Skills section (Strategic selection, endorsement count, relevance)
-        - Recommendations (Quality, quantity, diversity, recency)
-        - Contact information (Completeness, accessibility)
-        - Activity/posts section (Engagement quality, posting frequency, content relevance)
-        - Certifications (Industry relevance, credibility, recency)
-        - Languages (Professional advantage, proficiency levels)
-        - Volunteer experience (Leadership demonstration, social impact)
-
-        POSITIONING INSTRUCTIONS:
-        - For section titles, use the exact coordinates provided above
-        - Place markers slightly to the right of section titles (add ~5% to x coordinate)
-        - For profile elements without detected coordinates, estimate based on typical LinkedIn layout
-
-        SCORING CRITERIA (Be strict and realistic):
-        - GREEN (85-100): Exceptional, industry-leading, conversion-optimized
-        - YELLOW (60-84): Adequate but significant improvement needed for competitive advantage
-        - RED (0-59): Poor quality, severely limiting professional opportunities
-
-        RESPONSE FORMAT (STRICT JSON - NO MARKDOWN):
-        {{
-            "overall_score": 72,
-            "overall_feedback": "Detailed assessment with specific improvement priorities",
-            "critical_issues": ["List of 3-5 most urgent problems"],
-            "competitive_advantages": ["List of 2-3 strongest elements"],
-            "sections": [
-                {{
-                    "name": "Profile Photo",
-                    "coordinates": [x_percentage, y_percentage],
-                    "criticality": "yellow",
-                    "score": 65,
-                    "comment": "Specific, actionable feedback with industry context",
-                    "priority": 8,
-                    "improvements": ["Specific action item 1", "Specific action item 2", "Specific action item 3"],
-                    "industry_benchmark": "How this compares to top 10% of professionals",
-                    "impact_on_opportunities": "How this affects job/business prospects",
-                    "detailed_analysis": "Extended analysis with specific examples and recommendations"
-                }}
-            ],
-            "missing_elements": ["Critical sections not present in profile"],
-            "next_steps": ["Prioritized action plan with timeline suggestions"]
-        }}
 
-        Analyze this profile as if the person is competing for their dream role against 200+ other qualified candidates. Be thorough, precise, and constructively critical.
-        """
-        
-        try:
-            response = self.model.generate_content([prompt, image])
-            response_text = response.text
-            
-            # Extract JSON from response
-            if "```json" in response_text:
-                json_start = response_text.find("```json") + 7
-                json_end = response_text.find("```", json_start)
-                json_text = response_text[json_start:json_end].strip()
-            else:
-                json_start = response_text.find("{")
-                json_end = response_text.rfind("}") + 1
-                json_text = response_text[json_start:json_end]
-            
-            analysis = json.loads(json_text)
-            return analysis
-            
-        except Exception as e:
-            print(f"Error in analysis: {e}")
-            return None
-    
-    def create_interactive_html(self, image_path, analysis, output_path):
-        """Create interactive HTML page with embedded image and scrollable hoverable comments"""
-        
-        # Convert image to base64
-        image_base64 = self.encode_image_to_base64(image_path)
-        
-        # Get image dimensions for scaling
-        image = Image.open(image_path)
-        img_width, img_height = image.size
-        
-        # Determine image type
-        image_format = image.format.lower()
-        mime_type = f"image/{image_format}" if image_format in ['png', 'jpeg', 'jpg'] else "image/jpeg"
-        
-        # Safely get analysis values with defaults
-        overall_score = analysis.get('overall_score', 0)
-        overall_feedback = analysis.get('overall_feedback', 'No feedback available')
-        
-        # Determine score class
-        if overall_score >= 85:
-            score_class = 'score-excellent'
-        elif overall_score >= 60:
-            score_class = 'score-good'
-        else:
-            score_class = 'score-poor'
-        
-        # Create HTML content with enhanced scrollable tooltips
-        html_content = f"""
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>LinkedIn Profile Analysis - Interactive Report</title>
-        <style>
-            /* Your existing CSS styles here - keep them as is */
-            * {{
+# Report stylesheet; identical for every report so it is kept out of the f-strings
+_STATIC_CSS = """
+            * {
                 margin: 0;
                 padding: 0;
                 box-sizing: border-box;
-            }}
+            }
             
-            body {{
+            body {
                 font-family: 'Segoe UI', Tahoma, Geneva, Verdana, sans-serif;
                 background: linear-gradient(135deg, #667eea 0%, #764ba2 100%);
                 min-height: 100vh;
                 padding: 20px;
-            }}
+            }
             
-            .container {{
+            .container {
                 max-width: 1400px;
                 margin: 0 auto;
                 background: white;
                 border-radius: 20px;
                 box-shadow: 0 20px 60px rgba(0,0,0,0.1);
                 overflow: hidden;
-            }}
+            }
             
-            .header {{
+            .header {
                 background: linear-gradient(135deg, #0077b5, #005885);
                 color: white;
                 padding: 30px;
                 text-align: center;
-            }}
+            }
             
-            .score-display {{
+            .score-display {
                 font-size: 4em;
                 font-weight: bold;
                 margin: 20px 0;
                 text-shadow: 2px 2px 4px rgba(0,0,0,0.3);
-            }}
+            }
             
-            .score-excellent {{ color: #00ff88; }}
-            .score-good {{ color: #ffeb3b; }}
-            .score-poor {{ color: #ff6b6b; }}
+            .score-excellent { color: #00ff88; }
+            .score-good { color: #ffeb3b; }
+            .score-poor { color: #ff6b6b; }
             
-            .image-container {{
+            .image-container {
                 position: relative;
                 width: 100%;
                 margin: 0 auto;
                 background: #f8f9fa;
                 padding: 20px;
-            }}
+            }
             
-            .profile-image {{
+            .profile-image {
                 width: 100%;
                 height: auto;
                 display: block;
                 border-radius: 10px;
                 box-shadow: 0 10px 30px rgba(0,0,0,0.1);
-            }}
+            }
             
-            .info-button {{
+            .info-button {
                 position: absolute;
                 width: 26px;
                 height: 26px;
@@ -359,41 +262,41 @@ class InteractiveLinkedInAnalyzer:
                 box-shadow: 0 4px 15px rgba(0,0,0,0.2);
                 font-family: Arial, sans-serif;
                 border: 2px solid white;
-            }}
+            }
             
-            .info-button:hover {{
+            .info-button:hover {
                 transform: scale(1.3);
                 box-shadow: 0 8px 25px rgba(0,0,0,0.4);
                 z-index: 15;
-            }}
+            }
             
-            .info-button.red {{
+            .info-button.red {
                 background: linear-gradient(135deg, #ff6b6b, #ee5a52);
                 animation: pulse-red 2s infinite;
-            }}
+            }
             
-            .info-button.yellow {{
+            .info-button.yellow {
                 background: linear-gradient(135deg, #ffd93d, #ffcd02);
                 animation: pulse-yellow 2s infinite;
                 color: #333;
-            }}
+            }
             
-            .info-button.green {{
+            .info-button.green {
                 background: linear-gradient(135deg, #6bcf7f, #4caf50);
-            }}
+            }
             
-            @keyframes pulse-red {{
-                0%, 100% {{ transform: scale(1); }}
-                50% {{ transform: scale(1.1); }}
-            }}
+            @keyframes pulse-red {
+                0%, 100% { transform: scale(1); }
+                50% { transform: scale(1.1); }
+            }
             
-            @keyframes pulse-yellow {{
-                0%, 100% {{ transform: scale(1); }}
-                50% {{ transform: scale(1.05); }}
-            }}
+            @keyframes pulse-yellow {
+                0%, 100% { transform: scale(1); }
+                50% { transform: scale(1.05); }
+            }
             
             /* Enhanced Scrollable Tooltip Styles */
-            .tooltip {{
+            .tooltip {
                 position: absolute;
                 background: rgba(0,0,0,0.95);
                 color: white;
@@ -412,15 +315,15 @@ class InteractiveLinkedInAnalyzer:
                 pointer-events: none;
                 display: flex;
                 flex-direction: column;
-            }}
+            }
             
-            .tooltip.show {{
+            .tooltips-open .tooltip.show {
                 opacity: 1;
                 visibility: visible;
                 pointer-events: auto;
-            }}
+            }
             
-            .tooltip::before {{
+            .tooltip::before {
                 content: '';
                 position: absolute;
                 width: 0;
@@ -429,82 +332,82 @@ class InteractiveLinkedInAnalyzer:
                 border-bottom-color: rgba(0,0,0,0.95);
                 top: -24px;
                 left: 25px;
-            }}
+            }
             
-            .tooltip-header {{
+            .tooltip-header {
                 padding: 20px 20px 15px 20px;
                 border-bottom: 1px solid rgba(255,255,255,0.2);
                 flex-shrink: 0;
-            }}
+            }
             
-            .tooltip-title {{
+            .tooltip-title {
                 font-weight: bold;
                 font-size: 18px;
                 color: #4fc3f7;
                 margin-bottom: 10px;
-            }}
+            }
             
-            .tooltip-meta {{
+            .tooltip-meta {
                 display: flex;
                 gap: 15px;
                 flex-wrap: wrap;
                 margin-bottom: 10px;
-            }}
+            }
             
-            .tooltip-score {{
+            .tooltip-score {
                 background: linear-gradient(135deg, #667eea, #764ba2);
                 padding: 5px 12px;
                 border-radius: 15px;
                 font-size: 12px;
                 font-weight: bold;
-            }}
+            }
             
-            .tooltip-priority {{
+            .tooltip-priority {
                 background: rgba(255,255,255,0.1);
                 padding: 5px 12px;
                 border-radius: 15px;
                 font-size: 12px;
-            }}
+            }
             
-            .tooltip-content {{
+            .tooltip-content {
                 padding: 0 20px 20px 20px;
                 overflow-y: auto;
                 flex-grow: 1;
                 scrollbar-width: thin;
                 scrollbar-color: rgba(255,255,255,0.3) transparent;
-            }}
+            }
             
-            .tooltip-content::-webkit-scrollbar {{
+            .tooltip-content::-webkit-scrollbar {
                 width: 6px;
-            }}
+            }
             
-            .tooltip-content::-webkit-scrollbar-track {{
+            .tooltip-content::-webkit-scrollbar-track {
                 background: rgba(255,255,255,0.1);
                 border-radius: 3px;
-            }}
+            }
             
-            .tooltip-content::-webkit-scrollbar-thumb {{
+            .tooltip-content::-webkit-scrollbar-thumb {
                 background: rgba(255,255,255,0.3);
                 border-radius: 3px;
-            }}
+            }
             
-            .tooltip-content::-webkit-scrollbar-thumb:hover {{
+            .tooltip-content::-webkit-scrollbar-thumb:hover {
                 background: rgba(255,255,255,0.5);
-            }}
+            }
             
-            .tooltip-section {{
+            .tooltip-section {
                 margin-bottom: 20px;
                 padding-bottom: 15px;
                 border-bottom: 1px solid rgba(255,255,255,0.1);
-            }}
+            }
             
-            .tooltip-section:last-child {{
+            .tooltip-section:last-child {
                 border-bottom: none;
                 margin-bottom: 0;
                 padding-bottom: 0;
-            }}
+            }
             
-            .tooltip-section h4 {{
+            .tooltip-section h4 {
                 color: #81c784;
                 font-size: 14px;
                 margin-bottom: 10px;
@@ -512,399 +415,314 @@ class InteractiveLinkedInAnalyzer:
                 display: flex;
                 align-items: center;
                 gap: 8px;
-            }}
+            }
             
-            .tooltip-section p {{
+            .tooltip-section p {
                 margin-bottom: 10px;
                 color: #e8f5e8;
-            }}
+            }
             
-            .tooltip-section ul {{
+            .tooltip-section ul {
                 margin: 10px 0;
                 padding-left: 20px;
-            }}
+            }
             
-            .tooltip-section li {{
+            .tooltip-section li {
                 margin-bottom: 8px;
                 color: #e8f5e8;
-            }}
+            }
             
-            .scroll-indicator {{
+            .scroll-indicator {
                 position: absolute;
                 bottom: 10px;
                 right: 15px;
                 color: rgba(255,255,255,0.5);
                 font-size: 12px;
                 animation: fadeInOut 2s infinite;
-            }}
+            }
             
-            @keyframes fadeInOut {{
-                0%, 100% {{ opacity: 0.5; }}
-                50% {{ opacity: 1; }}
-            }}
+            @keyframes fadeInOut {
+                0%, 100% { opacity: 0.5; }
+                50% { opacity: 1; }
+            }
             
-            .summary-section {{
+            .summary-section {
                 padding: 40px;
                 background: #f8f9fa;
-            }}
+            }
             
-            .summary-grid {{
+            .summary-grid {
                 display: grid;
                 grid-template-columns: repeat(auto-fit, minmax(300px, 1fr));
                 gap: 30px;
                 margin-top: 30px;
-            }}
+            }
             
-            .summary-card {{
+            .summary-card {
                 background: white;
                 padding: 25px;
                 border-radius: 15px;
                 box-shadow: 0 5px 20px rgba(0,0,0,0.1);
                 border-left: 5px solid #0077b5;
-            }}
+            }
             
-            .summary-card h3 {{
+            .summary-card h3 {
                 color: #0077b5;
                 margin-bottom: 15px;
                 font-size: 1.2em;
-            }}
+            }
             
-            .summary-card ul {{
+            .summary-card ul {
                 list-style: none;
                 padding: 0;
-            }}
+            }
             
-            .summary-card li {{
+            .summary-card li {
                 margin-bottom: 12px;
                 padding: 8px 0;
                 border-bottom: 1px solid #eee;
                 color: #666;
-            }}
+            }
             
-            .summary-card li:last-child {{
+            .summary-card li:last-child {
                 border-bottom: none;
-            }}
+            }
             
-            .priority-indicator {{
+            .priority-indicator {
                 display: inline-block;
                 width: 8px;
                 height: 8px;
                 border-radius: 50%;
                 margin-right: 10px;
-            }}
+            }
             
-            .priority-high {{ background: #ff6b6b; }}
-            .priority-medium {{ background: #ffd93d; }}
-            .priority-low {{ background: #6bcf7f; }}
+            .priority-high { background: #ff6b6b; }
+            .priority-medium { background: #ffd93d; }
+            .priority-low { background: #6bcf7f; }
             
-            .instruction-banner {{
+            .instruction-banner {
                 background: linear-gradient(135deg, #4CAF50, #45a049);
                 color: white;
                 padding: 15px;
                 text-align: center;
                 font-size: 16px;
                 font-weight: 500;
-            }}
+            }
             
-            .stats-row {{
+            .stats-row {
                 display: flex;
                 justify-content: space-around;
                 margin: 20px 0;
                 flex-wrap: wrap;
-            }}
+            }
             
-            .stat-item {{
+            .stat-item {
                 text-align: center;
                 padding: 10px;
-            }}
+            }
             
-            .stat-number {{
+            .stat-number {
                 font-size: 2em;
                 font-weight: bold;
                 display: block;
-            }}
+            }
             
-            .stat-label {{
+            .stat-label {
                 font-size: 0.9em;
                 opacity: 0.9;
-            }}
+            }
             
-            @media (max-width: 768px) {{
-                .container {{
+            @media (max-width: 768px) {
+                .container {
                     margin: 10px;
                     border-radius: 10px;
-                }}
+                }
                 
-                .header {{
+                .header {
                     padding: 20px;
-                }}
+                }
                 
-                .score-display {{
+                .score-display {
                     font-size: 2.5em;
-                }}
+                }
                 
-                .image-container {{
+                .image-container {
                     padding: 10px;
-                }}
+                }
                 
-                .info-button {{
+                .info-button {
                     width: 22px;
                     height: 22px;
                     font-size: 12px;
-                }}
+                }
                 
-                .tooltip {{
+                .tooltip {
                     width: 320px;
                     max-height: 400px;
                     font-size: 13px;
-                }}
+                }
                 
-                .tooltip-header {{
+                .tooltip-header {
                     padding: 15px 15px 10px 15px;
-                }}
+                }
                 
-                .tooltip-content {{
+                .tooltip-content {
                     padding: 0 15px 15px 15px;
-                }}
+                }
                 
-                .summary-section {{
+                .summary-section {
                     padding: 20px;
-                }}
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="container">
-            <div class="header">
-                <h1>🔍 LinkedIn Profile Analysis</h1>
-                <div class="score-display {score_class}">{overall_score}/100</div>
-                <p style="font-size: 1.1em; margin-top: 10px; opacity: 0.95;">{overall_feedback}</p>
-        """
-        
-        # Add statistics - Fix the type conversion issue
-        sections = analysis.get('sections', [])
-        red_count = len([s for s in sections if s.get('criticality') == 'red'])
-        yellow_count = len([s for s in sections if s.get('criticality') == 'yellow'])
-        green_count = len([s for s in sections if s.get('criticality') == 'green'])
-        total_sections = len(sections)
-        
-        html_content += f"""
-            <div class="stats-row">
-                <div class="stat-item">
-                    <span class="stat-number" style="color: #ff6b6b;">{red_count}</span>
-                    <span class="stat-label">Critical Issues</span>
-                </div>
-                <div class="stat-item">
-                    <span class="stat-number" style="color: #ffd93d;">{yellow_count}</span>
-                    <span class="stat-label">Needs Improvement</span>
-                </div>
-                <div class="stat-item">
-                    <span class="stat-number" style="color: #6bcf7f;">{green_count}</span>
-                    <span class="stat-label">Excellent</span>
-                </div>
-                <div class="stat-item">
-                    <span class="stat-number" style="color: #4fc3f7;">{total_sections}</span>
-                    <span class="stat-label">Total Sections</span>
-                </div>
-            </div>
-        </div>
-        
-        <div class="instruction-banner">
-            💡 <strong>How to use:</strong> Click on the colored "i" buttons to see detailed feedback. Content is scrollable for longer analyses!
-        </div>
-        
-        <div class="image-container">
-            <img src="data:{mime_type};base64,{image_base64}" alt="LinkedIn Profile Screenshot" class="profile-image" id="profileImage">
-        """
-        
-        # Add info buttons for each section with improved positioning and safe type conversion
-        for i, section in enumerate(sections):
-            section_name = section.get('name', f'Section {i+1}')
-            
-            # Use new coordinate system if available, fallback to bbox
-            if 'coordinates' in section and section['coordinates']:
-                coordinates = section['coordinates']
-                x_pos = float(coordinates[0]) + 3.0  # Ensure float, offset slightly to the right
-                y_pos = float(coordinates[1])
-            else:
-                # Fallback to bbox system
-                bbox = section.get('bbox', [0, 0, 10, 10])
-                x_pos = float(bbox[2])
-                y_pos = float(bbox[1])
-            
-            criticality = section.get('criticality', 'yellow')
-            score = section.get('score', 'N/A')
-            comment = section.get('comment', 'No comment available')
-            priority = section.get('priority', 5)
-            improvements = section.get('improvements', [])
-            industry_benchmark = section.get('industry_benchmark', '')
-            impact_on_opportunities = section.get('impact_on_opportunities', '')
-            detailed_analysis = section.get('detailed_analysis', '')
-            
-            # Ensure coordinates are within bounds
-            x_pos = max(0.0, min(95.0, x_pos))
-            y_pos = max(0.0, min(95.0, y_pos))
-            
-            # Convert score to string if it's a number
-            score_display = str(score) if isinstance(score, (int, float)) else score
-            priority_display = str(priority) if isinstance(priority, (int, float)) else priority
-            
-            html_content += f"""
-            <div class="info-button {criticality}" 
-                style="left: {x_pos:.1f}%; top: {y_pos:.1f}%;"
-                data-tooltip-id="tooltip-{i}">
-                i
-            </div>
-            
-            <div class="tooltip" id="tooltip-{i}">
-                <div class="tooltip-header">
-                    <div class="tooltip-title">{section_name}</div>
-                    <div class="tooltip-meta">
-                        <div class="tooltip-score">Score: {score_display}/100</div>
-                        <div class="tooltip-priority">Priority: {priority_display}/10</div>
-                    </div>
-                </div>
-                <div class="tooltip-content">
-                    <div class="tooltip-section">
-                        <h4>📋 Overview</h4>
-                        <p>{comment}</p>
-                        {f'<p><strong>Detailed Analysis:</strong> {detailed_analysis}</p>' if detailed_analysis else ''}
-                    </div>
-            """
-            
-            # Add improvements section if available
-            if improvements:
-                html_content += """
-                    <div class="tooltip-section">
-                        <h4>🎯 Recommended Actions</h4>
-                        <ul>
-                """
-                for imp in improvements[:5]:  # Limit to first 5 improvements
-                    html_content += f"<li>{imp}</li>"
-                html_content += "</ul></div>"
-            
-            # Add industry benchmark if available
-            if industry_benchmark:
-                html_content += f"""
-                    <div class="tooltip-section">
-                        <h4>📊 Industry Benchmark</h4>
-                        <p>{industry_benchmark}</p>
-                    </div>
-                """
-            
-            # Add career impact if available
-            if impact_on_opportunities:
-                html_content += f"""
-                    <div class="tooltip-section">
-                        <h4>💼 Career Impact</h4>
-                        <p>{impact_on_opportunities}</p>
-                    </div>
-                """
-            
-            html_content += """
-                </div>
-                <div class="scroll-indicator">↕ Scroll for more</div>
-            </div>
-            """
-        
-        html_content += """
-        </div>
-        
-        <div class="summary-section">
-            <h2 style="text-align: center; color: #0077b5; margin-bottom: 30px;">📊 Analysis Summary</h2>
-            <div class="summary-grid">
-        """
-        
-        # Add summary cards with safe string handling
-        if analysis.get('critical_issues'):
-            html_content += """
-                <div class="summary-card" style="border-left-color: #ff6b6b;">
-                    <h3>🚨 Critical Issues</h3>
-                    <ul>
-            """
-            for issue in analysis['critical_issues']:
-                html_content += f"<li><span class='priority-indicator priority-high'></span>{issue}</li>"
-            html_content += "</ul></div>"
-        
-        if analysis.get('competitive_advantages'):
-            html_content += """
-                <div class="summary-card" style="border-left-color: #6bcf7f;">
-                    <h3>💪 Your Strengths</h3>
-                    <ul>
-            """
-            for advantage in analysis['competitive_advantages']:
-                html_content += f"<li><span class='priority-indicator priority-low'></span>{advantage}</li>"
-            html_content += "</ul></div>"
-        
-        if analysis.get('next_steps'):
-            html_content += """
-                <div class="summary-card" style="border-left-color: #4CAF50;">
-                    <h3>🎯 Action Plan</h3>
-                    <ul>
-            """
-            for step in analysis['next_steps']:
-                html_content += f"<li><span class='priority-indicator priority-medium'></span>{step}</li>"
-            html_content += "</ul></div>"
-        
-        if analysis.get('missing_elements'):
-            html_content += """
-                <div class="summary-card" style="border-left-color: #ff9800;">
-                    <h3>📋 Missing Elements</h3>
-                    <ul>
-            """
-            for element in analysis['missing_elements']:
-                html_content += f"<li><span class='priority-indicator priority-medium'></span>{element}</li>"
-            html_content += "</ul></div>"
-        
-        html_content += """
-            </div>
-        </div>
-    </div>
+                }
+            }
+"""
+
+def _minify_css(css):
+    """Strip comments and collapse whitespace around CSS punctuation"""
+    css = re.sub(r'/\*.*?\*/', '', css, flags=re.S)
+    css = re.sub(r'\s+', ' ', css)
+    return re.sub(r'\s*([{}:;,])\s*', r'\1', css).strip()
 
-    <script>
+# Minified once at import; every report embeds the same stylesheet
+_MIN_CSS = _minify_css(_STATIC_CSS)
+
+# Tooltip interaction script; embedded minified by the report template
+_REPORT_JS = """
         document.addEventListener('DOMContentLoaded', function() {
             const infoButtons = document.querySelectorAll('.info-button');
-            const tooltips = document.querySelectorAll('.tooltip');
-            
-            infoButtons.forEach(button => {
-                const tooltipId = button.getAttribute('data-tooltip-id');
-                const tooltip = document.getElementById(tooltipId);
+            const imageContainer = document.getElementById('image-container');
+            const tooltipData = JSON.parse(document.getElementById('tooltip-data').textContent);
+            const tooltipTemplate = document.getElementById('tooltip-tmpl');
+            
+            // Tooltips are built from the template the first time their button is clicked
+            // and remembered per button, so later clicks are a single Map hit
+            const tooltipsByButton = new Map();
+            
+            function getTooltip(button) {
+                let tooltip = tooltipsByButton.get(button);
+                if (tooltip) {
+                    return tooltip;
+                }
                 
-                // Click to toggle tooltip
-                button.addEventListener('click', function(e) {
-                    e.stopPropagation();
-                    
-                    // Hide all other tooltips
-                    tooltips.forEach(t => {
-                        if (t !== tooltip) {
-                            t.classList.remove('show');
-                        }
-                    });
-                    
-                    // Toggle current tooltip
-                    if (tooltip.classList.contains('show')) {
-                        tooltip.classList.remove('show');
+                const id = button.dataset.tooltipId;
+                const data = tooltipData[id];
+                tooltip = tooltipTemplate.content.firstElementChild.cloneNode(true);
+                tooltip.id = id;
+                
+                tooltip.querySelectorAll('[data-optional]').forEach(el => {
+                    const value = data[el.dataset.optional];
+                    if (!value || value.length === 0) {
+                        el.remove();
+                    }
+                });
+                
+                tooltip.querySelectorAll('[data-field]').forEach(el => {
+                    const value = data[el.dataset.field];
+                    if (Array.isArray(value)) {
+                        value.forEach(item => {
+                            const li = document.createElement('li');
+                            li.textContent = item;
+                            el.appendChild(li);
+                        });
                     } else {
-                        positionTooltip(button, tooltip);
-                        tooltip.classList.add('show');
+                        el.textContent = value == null ? '' : value;
                     }
                 });
                 
-                // Hover effects
-                button.addEventListener('mouseenter', function() {
-                    button.style.transform = 'scale(1.2)';
-                });
+                imageContainer.appendChild(tooltip);
+                tooltipsByButton.set(button, tooltip);
+                return tooltip;
+            }
+            
+            // The container rect only changes on scroll, resize or image load, so it is
+            // measured lazily after those instead of forcing a layout on every open
+            let cachedContainerRect = null;
+            function getContainerRect() {
+                if (cachedContainerRect === null) {
+                    cachedContainerRect = imageContainer.getBoundingClientRect();
+                }
+                return cachedContainerRect;
+            }
+            
+            window.addEventListener('scroll', function() {
+                cachedContainerRect = null;
+            }, { passive: true });
+            
+            window.addEventListener('load', function() {
+                cachedContainerRect = null;
+            });
+            
+            // At most one tooltip is open; tracking it makes opening and closing O(1).
+            // Tooltips are only visible while the body also carries tooltips-open.
+            let openTooltip = null;
+            
+            function isOpen(tooltip) {
+                return tooltip === openTooltip;
+            }
+            
+            function closeAllTooltips() {
+                if (openTooltip) {
+                    openTooltip.classList.remove('show');
+                    openTooltip = null;
+                }
+                document.body.classList.remove('tooltips-open');
+            }
+            
+            // One delegated click handler covers every button, tooltip and the page
+            document.addEventListener('click', function(e) {
+                const button = e.target.closest('.info-button');
                 
-                button.addEventListener('mouseleave', function() {
-                    if (!tooltip.classList.contains('show')) {
-                        button.style.transform = 'scale(1)';
+                if (button) {
+                    const tooltip = getTooltip(button);
+                    
+                    // Toggle current tooltip, hiding the previously open one
+                    if (isOpen(tooltip)) {
+                        closeAllTooltips();
+                    } else {
+                        if (openTooltip) {
+                            openTooltip.classList.remove('show');
+                        }
+                        positionTooltip(button, tooltip);
+                        tooltip.classList.add('show');
+                        openTooltip = tooltip;
+                        document.body.classList.add('tooltips-open');
                     }
+                    return;
+                }
+                
+                // Clicks inside a tooltip keep it open
+                if (e.target.closest('.tooltip')) {
+                    return;
+                }
+                
+                // Close tooltips when clicking outside
+                closeAllTooltips();
+                
+                // Reset button scales
+                infoButtons.forEach(button => {
+                    button.style.transform = 'scale(1)';
                 });
             });
             
+            // Hover effects, delegated the same way
+            document.addEventListener('mouseover', function(e) {
+                const button = e.target.closest('.info-button');
+                if (button && !button.contains(e.relatedTarget)) {
+                    button.style.transform = 'scale(1.2)';
+                }
+            });
+            
+            document.addEventListener('mouseout', function(e) {
+                const button = e.target.closest('.info-button');
+                if (button && !button.contains(e.relatedTarget)) {
+                    if (!openTooltip || openTooltip.id !== button.dataset.tooltipId) {
+                        button.style.transform = 'scale(1)';
+                    }
+                }
+            });
+            
             function positionTooltip(button, tooltip) {
                 const rect = button.getBoundingClientRect();
-                const containerRect = document.querySelector('.image-container').getBoundingClientRect();
+                const containerRect = getContainerRect();
                 
                 let left = rect.left - containerRect.left + rect.width + 15;
                 let top = rect.top - containerRect.top - 20;
@@ -917,110 +735,1135 @@ class InteractiveLinkedInAnalyzer:
                     top = rect.top - containerRect.top - 300 + rect.height;
                 }
                 
-                tooltip.style.left = left + 'px';
-                tooltip.style.top = top + 'px';
+                // Single style write instead of two separate invalidations
+                tooltip.style.cssText = `left:${left}px;top:${top}px`;
             }
             
-            // Close tooltips when clicking outside
-            document.addEventListener('click', function(e) {
-                if (!e.target.closest('.info-button') && !e.target.closest('.tooltip')) {
-                    tooltips.forEach(tooltip => {
-                        tooltip.classList.remove('show');
-                    });
-                    
-                    // Reset button scales
-                    infoButtons.forEach(button => {
-                        button.style.transform = 'scale(1)';
-                    });
-                }
-            });
-            
-            // Prevent tooltip from closing when clicking inside it
-            tooltips.forEach(tooltip => {
-                tooltip.addEventListener('click', function(e) {
-                    e.stopPropagation();
-                });
-            });
-            
-            // Handle window resize
+            // Handle window resize, closing tooltips once the resize settles
+            let resizeTimer;
             window.addEventListener('resize', function() {
-                tooltips.forEach(tooltip => {
-                    if (tooltip.classList.contains('show')) {
-                        tooltip.classList.remove('show');
-                    }
-                });
+                cachedContainerRect = null;
+                clearTimeout(resizeTimer);
+                resizeTimer = setTimeout(closeAllTooltips, 150);
             });
         });
-    </script>
-    </body>
-    </html>
+"""
+
+def _minify_js(js):
+    """Strip line comments and collapse whitespace
+
+    Only safe for _REPORT_JS: it has no "//" inside strings, no multi-space
+    string literals, and every statement ends in an explicit semicolon.
+    """
+    js = re.sub(r'^\s*//[^\n]*\n', '', js, flags=re.M)
+    return re.sub(r'\s+', ' ', js).strip()
+
+# Minified once at import; every report embeds the same script
+_MIN_JS = _minify_js(_REPORT_JS)
+
+# Summary cards as (analysis key, heading, border color, priority indicator class)
+_SUMMARY_CARDS = (
+    ('critical_issues', '🚨 Critical Issues', '#ff6b6b', 'priority-high'),
+    ('competitive_advantages', '💪 Your Strengths', '#6bcf7f', 'priority-low'),
+    ('next_steps', '🎯 Action Plan', '#4CAF50', 'priority-medium'),
+    ('missing_elements', '📋 Missing Elements', '#ff9800', 'priority-medium'),
+)
+
+# Report file buffer; fragments are small, so they are flushed in ~1 MiB writes
+REPORT_WRITE_BUFFER = 1 << 20
+
+# The report template is compiled once at import and located next to this script,
+# so reports render the same regardless of the working directory
+_REPORT_ENV = Environment(
+    loader=FileSystemLoader(Path(__file__).resolve().parent / 'templates'),
+    autoescape=select_autoescape(['html', 'html.j2']),
+    auto_reload=False,
+    trim_blocks=True,
+    lstrip_blocks=True,
+    # None renders as an empty string rather than "None"
+    finalize=lambda value: '' if value is None else value,
+)
+# tojson goes through orjson when available
+_REPORT_ENV.policies['json.dumps_function'] = _json_dumps
+_REPORT_ENV.policies['json.dumps_kwargs'] = {}
+_REPORT_ENV.globals.update(report_css=Markup(_MIN_CSS), report_js=Markup(_MIN_JS))
+_REPORT_TEMPLATE = _REPORT_ENV.get_template('linkedin_report.html.j2')
+
+@dataclass
+class PreparedImage:
+    """A screenshot read and decoded once, shared by every step of a request"""
+    path: str
+    pil: Image.Image  # downscaled RGB copy used for upload and the report
+    raw_bytes: bytes  # original file contents
+    width: int  # original dimensions
+    height: int
+    mime: str  # original format
+    sha256: str  # hash of raw_bytes, the result-cache key
+    upload_part: dict  # JPEG blob sent to Gemini
+    has_metadata: bool = False  # source carries EXIF, ICC or XMP data
+
+@dataclass
+class SectionView:
+    """One analysis section normalized once, with the defaults the report falls back to"""
+    name: str
+    criticality: str = 'yellow'
+    score: object = 'N/A'
+    comment: str = 'No comment available'
+    priority: object = 5
+    improvements: list = field(default_factory=list)
+    industry_benchmark: str = ''
+    impact_on_opportunities: str = ''
+    detailed_analysis: str = ''
+    coordinates: Optional[list] = None
+    bbox: list = field(default_factory=lambda: [0, 0, 10, 10])
+    
+    @classmethod
+    def from_dict(cls, section, index):
+        """Build a view from a raw Gemini section, ignoring keys the report does not use"""
+        known = {k: v for k, v in section.items() if k in _SECTION_VIEW_FIELDS}
+        known.setdefault('name', f'Section {index + 1}')
+        return cls(**known)
+
+_SECTION_VIEW_FIELDS = frozenset(f.name for f in fields(SectionView))
+
+# Folded into the analysis prompt when a single call must also locate sections
+SECTION_LOCALIZATION_INSTRUCTIONS = """
+            SECTION LOCALIZATION (REQUIRED):
+            - For every entry in "sections", locate the FIRST LETTER of that section's title/header in the screenshot
+            - Measure it as [x_percentage, y_percentage] (0-100) from the top-left corner of the image, using the leftmost and topmost pixel of the letter
+            - For elements without a title (profile photo, banner, headline), use the top-left corner of the element
+            - Derive each "coordinates" value from this measurement following the positioning instructions below
+            - Every section MUST include "coordinates"
+            """
+
+class ResultCache:
+    """Content-addressed cache of parsed Gemini results, kept in memory and on disk
+    
+    Values are stored as JSON text so every hit returns a fresh copy that
+    callers can mutate without corrupting the cache. The in-memory tier is an
+    LRU holding at most max_memory_entries results; the on-disk tier keeps the
+    max_disk_entries most recently used files, by modification time.
+    """
+    
+    def __init__(self, cache_dir=DEFAULT_CACHE_DIR, max_memory_entries=RESULT_CACHE_MEMORY_ENTRIES,
+                 max_disk_entries=RESULT_CACHE_DISK_ENTRIES):
+        self.cache_dir = Path(cache_dir) if cache_dir else None
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_entries = max_disk_entries
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def _remember(self, key, payload):
+        """Store payload in the memory tier, evicting the least recently used entries"""
+        with self._lock:
+            self._memory[key] = payload
+            self._memory.move_to_end(key)
+            while len(self._memory) > self.max_memory_entries:
+                self._memory.popitem(last=False)
+    
+    def get(self, key):
+        """Return the cached value for key, or None on a miss
+        
+        An unreadable or corrupt cache file (e.g. one truncated by a killed
+        process) is treated as a miss and removed so the next put replaces it.
+        """
+        with self._lock:
+            payload = self._memory.get(key)
+            if payload is not None:
+                self._memory.move_to_end(key)
+        
+        if payload is not None:
+            return _json_loads(payload)
+        
+        if not self.cache_dir:
+            return None
+        
+        cache_file = self.cache_dir / f"{key}.json"
+        try:
+            payload = cache_file.read_text(encoding='utf-8')
+            value = _json_loads(payload)
+        except FileNotFoundError:
+            return None
+        except (OSError, ValueError) as e:
+            print(f"⚠️  Discarding unreadable result cache entry {cache_file.name}: {e}")
+            try:
+                cache_file.unlink()
+            except OSError:
+                pass
+            return None
+        
+        try:
+            # Mark the file as recently used so pruning keeps it
+            os.utime(cache_file)
+        except OSError:
+            pass
+        
+        self._remember(key, payload)
+        return value
+    
+    def put(self, key, value):
+        """Store value under key in memory and, when configured, on disk"""
+        payload = _json_dumps(value)
+        self._remember(key, payload)
+        
+        if self.cache_dir:
+            tmp_file = None
+            try:
+                self.cache_dir.mkdir(parents=True, exist_ok=True)
+                # Several processes share the cache directory, so the temp name must be unique across them
+                with tempfile.NamedTemporaryFile('w', encoding='utf-8', dir=self.cache_dir,
+                                                 prefix=f"{key}.", suffix='.tmp', delete=False) as f:
+                    tmp_file = f.name
+                    f.write(payload)
+                os.replace(tmp_file, self.cache_dir / f"{key}.json")
+            except OSError as e:
+                print(f"⚠️  Could not write result cache: {e}")
+                if tmp_file:
+                    Path(tmp_file).unlink(missing_ok=True)
+                return
+            
+            self._prune_disk()
+    
+    def _prune_disk(self):
+        """Delete the least recently used cache files beyond max_disk_entries"""
+        try:
+            entries = []
+            for entry in os.scandir(self.cache_dir):
+                if entry.name.endswith('.json'):
+                    try:
+                        entries.append((entry.stat().st_mtime, entry.path))
+                    except OSError:
+                        continue
+        except OSError:
+            return
+        
+        if len(entries) <= self.max_disk_entries:
+            return
+        
+        entries.sort()
+        for _, path in entries[:len(entries) - self.max_disk_entries]:
+            try:
+                os.unlink(path)
+            except OSError:
+                # Already removed by a concurrent process
+                pass
+
+class InteractiveLinkedInAnalyzer:
+    def __init__(self, api_key, max_concurrent_requests=4, cache_dir=DEFAULT_CACHE_DIR):
+        """Initialize the analyzer with Gemini API key"""
+        genai = _get_genai()
+        genai.configure(api_key=api_key)
+        self.model = genai.GenerativeModel('gemini-2.0-flash')
+        self.max_concurrent_requests = max_concurrent_requests
+        self.cache = ResultCache(cache_dir)
+        self._semaphore = None
+        self._semaphore_loop = None
+        self._prepared_images = OrderedDict()
+        self._prepared_images_lock = threading.Lock()
+        
+    def prepare_image(self, image_path):
+        """Read, hash, downscale and JPEG-encode a screenshot once
+        
+        The most recent PREPARED_IMAGE_CACHE_SIZE results are cached per path
+        and invalidated when the file's mtime changes, so repeated calls for
+        the same file within a request are free.
+        """
+        mtime = os.path.getmtime(image_path)
+        with self._prepared_images_lock:
+            cached = self._prepared_images.get(image_path)
+            if cached and cached[0] == mtime:
+                self._prepared_images.move_to_end(image_path)
+                return cached[1]
+        
+        raw_bytes = Path(image_path).read_bytes()
+        image = Image.open(io.BytesIO(raw_bytes))
+        width, height = image.size
+        mime = Image.MIME.get(image.format, 'image/png')
+        has_metadata = any(key in image.info for key in ('exif', 'icc_profile', 'xmp'))
+        
+        image.thumbnail(MAX_IMAGE_SIZE, Image.LANCZOS)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=UPLOAD_JPEG_QUALITY)
+        
+        prepared = PreparedImage(
+            path=image_path,
+            pil=image,
+            raw_bytes=raw_bytes,
+            width=width,
+            height=height,
+            mime=mime,
+            sha256=hashlib.sha256(raw_bytes).hexdigest(),
+            upload_part={'mime_type': 'image/jpeg', 'data': buffer.getvalue()},
+            has_metadata=has_metadata,
+        )
+        with self._prepared_images_lock:
+            self._prepared_images[image_path] = (mtime, prepared)
+            self._prepared_images.move_to_end(image_path)
+            while len(self._prepared_images) > PREPARED_IMAGE_CACHE_SIZE:
+                self._prepared_images.popitem(last=False)
+        return prepared
+    
+    def _as_prepared(self, image):
+        """Accept either an image path or an already PreparedImage"""
+        return image if isinstance(image, PreparedImage) else self.prepare_image(image)
+    
+    async def _as_prepared_async(self, image):
+        """Async variant of _as_prepared; reading and decoding a path runs off the event loop"""
+        if isinstance(image, PreparedImage):
+            return image
+        return await asyncio.to_thread(self.prepare_image, image)
+    
+    def _cache_key(self, image_hash, kind, context=None):
+        """Cache key for one Gemini result on one image under the current prompts"""
+        key = f"{image_hash}-v{PROMPT_VERSION}.{kind}"
+        if context:
+            key += "-" + hashlib.sha256(json.dumps(context, sort_keys=True).encode('utf-8')).hexdigest()[:16]
+        return key
+    
+    def _image_to_data_uri(self, pil_img):
+        """Encode an image as a metadata-free progressive JPEG data URI for the report"""
+        rgb = pil_img.convert('RGB') if pil_img.mode != 'RGB' else pil_img
+        with io.BytesIO() as buffer:
+            # Saving without exif/icc_profile drops the source metadata
+            rgb.save(buffer, 'JPEG', quality=REPORT_JPEG_QUALITY, optimize=True, progressive=True)
+            return f"data:image/jpeg;base64,{_b64.b64encode(buffer.getvalue()).decode('ascii')}"
+    
+    def _report_image_src(self, prepared):
+        """Data URI for the report image, skipping the re-encode when the source is already a small JPEG
+        
+        Sources with metadata are always re-encoded: the original bytes would
+        leak EXIF data such as GPS position, and the browser would apply an
+        EXIF orientation that the image sent to Gemini never had.
         """
+        if (prepared.mime == 'image/jpeg'
+                and not prepared.has_metadata
+                and prepared.pil.size == (prepared.width, prepared.height)
+                and len(prepared.raw_bytes) <= REPORT_PASSTHROUGH_MAX_BYTES):
+            # The bytes are already in memory from prepare_image; one C-level encode, no decode/encode round trip
+            return f"data:image/jpeg;base64,{_b64.b64encode(prepared.raw_bytes).decode('ascii')}"
+        return self._image_to_data_uri(prepared.pil)
+    
+    def _gemini_semaphore(self):
+        """Semaphore capping concurrent Gemini requests on the running event loop"""
+        loop = asyncio.get_running_loop()
+        if self._semaphore is None or self._semaphore_loop is not loop:
+            self._semaphore = asyncio.Semaphore(self.max_concurrent_requests)
+            self._semaphore_loop = loop
+        return self._semaphore
+    
+    def _retry_delay(self, error, attempt):
+        """Seconds to wait before the next attempt, honoring server retry hints on 429s
+        
+        Server hints are returned as given so callers can give up on ones above
+        MAX_RETRY_DELAY; the local backoff is capped at MAX_RETRY_DELAY.
+        """
+        if isinstance(error, _get_google_exceptions().ResourceExhausted):
+            for hint in [getattr(error, 'retry', None), *(getattr(error, 'details', None) or [])]:
+                retry_delay = getattr(hint, 'retry_delay', None)
+                if retry_delay is not None:
+                    return retry_delay.seconds + retry_delay.nanos / 1e9
+            
+            headers = getattr(getattr(error, 'response', None), 'headers', None) or {}
+            retry_after = headers.get('Retry-After')
+            if retry_after and str(retry_after).isdigit():
+                return float(retry_after)
+        
+        return min(2 ** attempt + random.uniform(0, 1), MAX_RETRY_DELAY)
+    
+    def _generate_with_retry(self, parts, max_attempts=3, **kwargs):
+        """Call Gemini with exponential backoff on transient errors"""
+        for attempt in range(max_attempts):
+            try:
+                return self.model.generate_content(parts, **kwargs)
+            except _retryable_errors() as e:
+                if attempt == max_attempts - 1:
+                    raise
+                delay = self._retry_delay(e, attempt)
+                if delay > MAX_RETRY_DELAY:
+                    # Waiting that long would outlive the caller's timeout
+                    raise
+                print(f"⏳ Gemini request failed ({e.__class__.__name__}), retrying in {delay:.1f}s...")
+                time.sleep(delay)
+    
+    async def _generate_with_retry_async(self, parts, max_attempts=3):
+        """Async variant of _generate_with_retry, holding the concurrency semaphore per attempt"""
+        for attempt in range(max_attempts):
+            try:
+                async with self._gemini_semaphore():
+                    return await self.model.generate_content_async(parts)
+            except _retryable_errors() as e:
+                if attempt == max_attempts - 1:
+                    raise
+                delay = self._retry_delay(e, attempt)
+                if delay > MAX_RETRY_DELAY:
+                    # Waiting that long would outlive the caller's timeout
+                    raise
+                print(f"⏳ Gemini request failed ({e.__class__.__name__}), retrying in {delay:.1f}s...")
+                await asyncio.sleep(delay)
+    
+    def _extract_json(self, response_text):
+        """Slice the first top-level JSON object out of a model response
+        
+        Unwraps a markdown code fence if present, then walks the text once
+        tracking brace depth and string/escape state, stopping as soon as the
+        top-level object closes so trailing prose is never scanned.
+        """
+        fence = _JSON_FENCE_RE.search(response_text)
+        if fence:
+            response_text = fence.group(1)
+        
+        start = response_text.find("{")
+        if start == -1:
+            return response_text
+        
+        depth = 0
+        in_string = False
+        skip_until = -1
+        for match in _JSON_TOKEN_RE.finditer(response_text, start):
+            position = match.start()
+            if position < skip_until:
+                continue
+            
+            char = match.group()
+            if in_string:
+                if char == "\\":
+                    skip_until = position + 2
+                elif char == '"':
+                    in_string = False
+            elif char == '"':
+                in_string = True
+            elif char == "{":
+                depth += 1
+            elif char == "}":
+                depth -= 1
+                if depth == 0:
+                    return response_text[start:position + 1]
+        
+        # Unterminated object - let the JSON parser report where it breaks
+        return response_text[start:]
+    
+    def _parse_coordinate_response(self, response_text):
+        """Extract and post-process the coordinate JSON returned by Gemini"""
+        
+        json_text = self._extract_json(response_text)
+        coordinates = _json_loads(json_text)
+        
+        # Post-process coordinates for better accuracy
+        sections = coordinates.get('detected_sections') if coordinates else None
+        if sections:
+            # Only [x, y] is used; the model sometimes returns [x, y, w, h] for some entries
+            coords_arr = np.asarray([(s.get('title_coordinates') or [0, 0])[:2] for s in sections], dtype=np.float64)
+            
+            # Ensure coordinates are within valid bounds
+            coords_arr = np.clip(coords_arr, 0.0, 100.0)
+            
+            # Adjust x-coordinate slightly left to account for any margin
+            coords_arr[:, 0] = np.maximum(coords_arr[:, 0] - 0.5, 0.0)
+            
+            # Sort sections by vertical position (top to bottom)
+            order = np.argsort(coords_arr[:, 1], kind='stable')
+            
+            sorted_sections = []
+            for idx in order:
+                section = sections[idx]
+                section['title_coordinates'] = coords_arr[idx].tolist()
+                
+                # Add precision metadata
+                section['coordinate_precision'] = 'high' if section.get('confidence', 0) >= 85 else 'medium'
+                sorted_sections.append(section)
+            
+            coordinates['detected_sections'] = sorted_sections
+        
+        return coordinates
+    
+    def identify_section_coordinates(self, image):
+        """Identify exact coordinates of the first letter of section titles with enhanced precision"""
+        
+        prepared = self._as_prepared(image)
+        cache_key = self._cache_key(prepared.sha256, 'coords')
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = self._generate_with_retry([COORDINATE_PROMPT, prepared.upload_part])
+            response_text = response.text
+            coordinates = self._parse_coordinate_response(response_text)
+            self.cache.put(cache_key, coordinates)
+            return coordinates
+            
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error in coordinate detection: {e}")
+            print(f"Raw response: {response_text}")
+            return None
+            
+        except Exception as e:
+            print(f"Error in coordinate detection: {e}")
+            return None
+    
+    async def identify_section_coordinates_async(self, image):
+        """Async variant of identify_section_coordinates"""
+        
+        prepared = await self._as_prepared_async(image)
+        cache_key = self._cache_key(prepared.sha256, 'coords')
+        cached = await asyncio.to_thread(self.cache.get, cache_key)
+        if cached is not None:
+            return cached
+        
+        try:
+            response = await self._generate_with_retry_async([COORDINATE_PROMPT, prepared.upload_part])
+            response_text = response.text
+            coordinates = self._parse_coordinate_response(response_text)
+            await asyncio.to_thread(self.cache.put, cache_key, coordinates)
+            return coordinates
+            
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error in coordinate detection: {e}")
+            print(f"Raw response: {response_text}")
+            return None
+            
+        except Exception as e:
+            print(f"Error in coordinate detection: {e}")
+            return None
+    
+    def _coordinate_context_sections(self, section_coordinates):
+        """Detected sections that will be embedded in the analysis prompt, if any"""
+        if section_coordinates and section_coordinates.get('detected_sections'):
+            return section_coordinates['detected_sections']
+        return None
+    
+    def _build_analysis_prompt(self, section_coordinates=None, locate_sections=False):
+        """Build the profile analysis prompt, optionally with detected coordinate context
         
-        # Write HTML file
-        with open(output_path, 'w', encoding='utf-8') as f:
-            f.write(html_content)
+        With locate_sections the prompt instead asks Gemini to measure each
+        section title's position itself, folding coordinate detection into the
+        analysis call.
+        """
+        
+        # Build coordinate context for better analysis
+        coordinate_context = ""
+        positioning_requirement = "Use the detected section coordinates above to provide accurate positioning"
+        title_positioning = "For section titles, use the exact coordinates provided above"
+        detected_sections = self._coordinate_context_sections(section_coordinates)
+        if locate_sections:
+            coordinate_context = SECTION_LOCALIZATION_INSTRUCTIONS
+            # No coordinates are supplied in this mode; point at the model's own measurements instead
+            positioning_requirement = "Use the section title positions you measured above to provide accurate positioning"
+            title_positioning = "For section titles, start from the first-letter position you measured for that section"
+        elif detected_sections:
+            coordinate_context = f"""
+            DETECTED SECTION COORDINATES (for reference):
+            {_json_dumps(detected_sections, indent=True)}
+            
+            Use these coordinates to provide more accurate bounding boxes for your analysis.
+            """
+        
+        # Updated prompt with coordinate awareness
+        prompt = f"""
+        You are an expert LinkedIn profile optimization consultant with 15+ years of experience. Analyze this LinkedIn profile screenshot with extreme precision and provide comprehensive feedback.
+
+        {coordinate_context}
+
+        CRITICAL ANALYSIS REQUIREMENTS:
+        1. Examine EVERY visible element in the profile screenshot
+        2. {positioning_requirement}
+        3. Apply STRICT professional standards - be harsh but constructive
+        4. Focus on conversion optimization and professional branding impact
+
+        MANDATORY SECTIONS TO ANALYZE (if visible):
+        - Profile photo (Professional quality, lighting, attire, background, facial expression)
+        - Background banner (Brand consistency, visual appeal, message clarity)
+        - Headline/title (Keyword optimization, value proposition, character count)
+        - Summary/About section (Storytelling, achievements, call-to-action, length)
+        - Experience entries (Impact metrics, keyword density, accomplishment focus)
+        - Education (Relevance, completeness, additional credentials)
+        - Skills section (Strategic selection, endorsement count, relevance)
+        - Recommendations (Quality, quantity, diversity, recency)
+        - Contact information (Completeness, accessibility)
+        - Activity/posts section (Engagement quality, posting frequency, content relevance)
+        - Certifications (Industry relevance, credibility, recency)
+        - Languages (Professional advantage, proficiency levels)
+        - Volunteer experience (Leadership demonstration, social impact)
+
+        POSITIONING INSTRUCTIONS:
+        - {title_positioning}
+        - Place markers slightly to the right of section titles (add ~5% to x coordinate)
+        - For profile elements without detected coordinates, estimate based on typical LinkedIn layout
+
+        SCORING CRITERIA (Be strict and realistic):
+        - GREEN (85-100): Exceptional, industry-leading, conversion-optimized
+        - YELLOW (60-84): Adequate but significant improvement needed for competitive advantage
+        - RED (0-59): Poor quality, severely limiting professional opportunities
+
+        RESPONSE FORMAT (STRICT JSON - NO MARKDOWN):
+        {{
+            "overall_score": 72,
+            "overall_feedback": "Detailed assessment with specific improvement priorities",
+            "critical_issues": ["List of 3-5 most urgent problems"],
+            "competitive_advantages": ["List of 2-3 strongest elements"],
+            "sections": [
+                {{
+                    "name": "Profile Photo",
+                    "coordinates": [x_percentage, y_percentage],
+                    "criticality": "yellow",
+                    "score": 65,
+                    "comment": "Specific, actionable feedback with industry context",
+                    "priority": 8,
+                    "improvements": ["Specific action item 1", "Specific action item 2", "Specific action item 3"],
+                    "industry_benchmark": "How this compares to top 10% of professionals",
+                    "impact_on_opportunities": "How this affects job/business prospects",
+                    "detailed_analysis": "Extended analysis with specific examples and recommendations"
+                }}
+            ],
+            "missing_elements": ["Critical sections not present in profile"],
+            "next_steps": ["Prioritized action plan with timeline suggestions"]
+        }}
+
+        Analyze this profile as if the person is competing for their dream role against 200+ other qualified candidates. Be thorough, precise, and constructively critical.
+        """
+        
+        return prompt
+    
+    def _parse_analysis_response(self, response_text):
+        """Extract the analysis JSON returned by Gemini"""
+        
+        return _json_loads(self._extract_json(response_text))
+    
+    def analyze_profile(self, image, section_coordinates=None):
+        """Analyze LinkedIn profile screenshot using Gemini with coordinate context"""
+        
+        prepared = self._as_prepared(image)
+        cache_key = self._cache_key(prepared.sha256, 'analysis', self._coordinate_context_sections(section_coordinates))
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        prompt = self._build_analysis_prompt(section_coordinates)
+        
+        try:
+            response = self._generate_with_retry([prompt, prepared.upload_part])
+            response_text = response.text
+            analysis = self._parse_analysis_response(response_text)
+            self.cache.put(cache_key, analysis)
+            return analysis
+            
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error in analysis: {e}")
+            print(f"Raw response: {response_text}")
+            return None
+            
+        except Exception as e:
+            print(f"Error in analysis: {e}")
+            return None
+    
+    async def analyze_profile_async(self, image, section_coordinates=None):
+        """Async variant of analyze_profile"""
+        
+        prepared = await self._as_prepared_async(image)
+        cache_key = self._cache_key(prepared.sha256, 'analysis', self._coordinate_context_sections(section_coordinates))
+        cached = await asyncio.to_thread(self.cache.get, cache_key)
+        if cached is not None:
+            return cached
+        
+        prompt = self._build_analysis_prompt(section_coordinates)
+        
+        try:
+            response = await self._generate_with_retry_async([prompt, prepared.upload_part])
+            response_text = response.text
+            analysis = self._parse_analysis_response(response_text)
+            await asyncio.to_thread(self.cache.put, cache_key, analysis)
+            return analysis
+            
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error in analysis: {e}")
+            print(f"Raw response: {response_text}")
+            return None
+            
+        except Exception as e:
+            print(f"Error in analysis: {e}")
+            return None
+    
+    def analyze_profile_unified(self, image):
+        """Analyze the profile and locate its sections in a single Gemini call
+        
+        Returns the same schema as analyze_profile, with each section's
+        coordinates measured by the model itself. Callers should fill in the
+        sections it left unplaced with identify_section_coordinates when
+        has_section_coordinates is False.
+        """
+        
+        prepared = self._as_prepared(image)
+        cache_key = self._cache_key(prepared.sha256, 'unified')
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        prompt = self._build_analysis_prompt(locate_sections=True)
+        
+        try:
+            response = self._generate_with_retry([prompt, prepared.upload_part])
+            response_text = response.text
+            analysis = self._parse_analysis_response(response_text)
+            self.cache.put(cache_key, analysis)
+            return analysis
+            
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error in analysis: {e}")
+            print(f"Raw response: {response_text}")
+            return None
+            
+        except Exception as e:
+            print(f"Error in analysis: {e}")
+            return None
+    
+    async def analyze_profile_unified_async(self, image):
+        """Async variant of analyze_profile_unified"""
+        
+        prepared = await self._as_prepared_async(image)
+        cache_key = self._cache_key(prepared.sha256, 'unified')
+        cached = await asyncio.to_thread(self.cache.get, cache_key)
+        if cached is not None:
+            return cached
+        
+        prompt = self._build_analysis_prompt(locate_sections=True)
+        
+        try:
+            response = await self._generate_with_retry_async([prompt, prepared.upload_part])
+            response_text = response.text
+            analysis = self._parse_analysis_response(response_text)
+            await asyncio.to_thread(self.cache.put, cache_key, analysis)
+            return analysis
+        
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error in analysis: {e}")
+            print(f"Raw response: {response_text}")
+            return None
+        
+        except Exception as e:
+            print(f"Error in analysis: {e}")
+            return None
+    
+    def _section_has_coordinates(self, section):
+        """True when a single analyzed section carries an [x, y] marker position"""
+        coordinates = section.get('coordinates')
+        return isinstance(coordinates, list) and len(coordinates) >= 2
+    
+    def located_section_count(self, analysis):
+        """Number of analyzed sections that carry an [x, y] marker position"""
+        return sum(1 for section in (analysis or {}).get('sections', []) if self._section_has_coordinates(section))
+    
+    def has_section_coordinates(self, analysis):
+        """True when every analyzed section carries an [x, y] marker position"""
+        sections = (analysis or {}).get('sections')
+        if not sections:
+            return False
+        return all(self._section_has_coordinates(section) for section in sections)
+    
+    def analyze_profile_stream(self, image, section_coordinates=None):
+        """Stream a profile analysis, yielding (partial_result, done) as Gemini generates it
+        
+        partial_result holds the top-level fields and the sections that have
+        fully arrived so far. The last yield carries the complete parsed
+        analysis (or None on failure) with done=True. Without ijson installed
+        only the final result is yielded.
+        """
+        
+        prepared = self._as_prepared(image)
+        cache_key = self._cache_key(prepared.sha256, 'analysis', self._coordinate_context_sections(section_coordinates))
+        cached = self.cache.get(cache_key)
+        if cached is not None:
+            yield cached, True
+            return
+        
+        prompt = self._build_analysis_prompt(section_coordinates)
+        
+        partial = {'sections': []}
+        parsers = []
+        if ijson is not None:
+            top_level_items, sections = ijson.sendable_list(), ijson.sendable_list()
+            parsers = [
+                ijson.kvitems_coro(top_level_items, '', use_float=True),
+                ijson.items_coro(sections, 'sections.item', use_float=True),
+            ]
+        
+        chunks = []
+        json_started = False
+        try:
+            response = self._generate_with_retry([prompt, prepared.upload_part], stream=True)
+            for chunk in response:
+                chunks.append(chunk.text)
+                if not parsers:
+                    continue
+                
+                # Skip any markdown fence or preamble before the object opens
+                text = chunk.text
+                if not json_started:
+                    json_start = text.find("{")
+                    if json_start == -1:
+                        continue
+                    text = text[json_start:]
+                    json_started = True
+                
+                data = text.encode('utf-8')
+                for parser in list(parsers):
+                    try:
+                        parser.send(data)
+                    except ijson.JSONError:
+                        # Trailing fence or prose after the object; the final parse still sees everything
+                        parsers.remove(parser)
+                
+                if not top_level_items and not sections:
+                    continue
+                for key, value in top_level_items:
+                    if key != 'sections':
+                        partial[key] = value
+                partial['sections'].extend(sections)
+                del top_level_items[:], sections[:]
+                yield {**partial, 'sections': list(partial['sections'])}, False
+            
+            response_text = "".join(chunks)
+            
+            # A stream cut off mid-object is not worth a parse attempt
+            if not self._extract_json(response_text).rstrip().endswith(("}", "]")):
+                print("Analysis stream ended before the JSON response was complete")
+                print(f"Raw response: {response_text}")
+                yield None, True
+                return
+            
+            analysis = self._parse_analysis_response(response_text)
+            self.cache.put(cache_key, analysis)
+            yield analysis, True
+            
+        except json.JSONDecodeError as e:
+            print(f"JSON parsing error in analysis: {e}")
+            print(f"Raw response: {response_text}")
+            yield None, True
+            
+        except Exception as e:
+            print(f"Error in analysis: {e}")
+            yield None, True
+    
+    def _merge_section_coordinates(self, analysis, section_coordinates, only_missing=False):
+        """Pin analysis markers to detected section titles where the names match
+        
+        With only_missing, sections that already carry coordinates keep them and
+        only the unplaced ones are matched against the detected titles.
+        
+        Exact (case-insensitive) name matches are paired first; remaining
+        sections then take the longest detected title contained in their name.
+        Each detected title is used for at most one section, so "Volunteer
+        Experience" is never pinned to the "Experience" header.
+        """
+        
+        detected = {}
+        for section in section_coordinates.get('detected_sections', []):
+            section_name = (section.get('section_name') or '').strip().lower()
+            if section_name and section.get('title_coordinates') and section_name not in detected:
+                detected[section_name] = section['title_coordinates']
+        
+        sections = [
+            (section, (section.get('name') or '').strip().lower())
+            for section in analysis.get('sections', [])
+            if not (only_missing and self._section_has_coordinates(section))
+        ]
+        matches = {}
+        
+        for i, (section, name) in enumerate(sections):
+            if name in detected:
+                matches[i] = name
+        
+        used = set(matches.values())
+        for i, (section, name) in enumerate(sections):
+            if i in matches:
+                continue
+            candidates = [n for n in detected if n not in used and n in name]
+            if candidates:
+                matches[i] = max(candidates, key=len)
+                used.add(matches[i])
+        
+        for i, section_name in matches.items():
+            coords = detected[section_name]
+            # Place markers slightly to the right of section titles
+            sections[i][0]['coordinates'] = [min(100.0, coords[0] + 5.0), coords[1]]
+        
+        return analysis
+    
+    async def analyze(self, image):
+        """Run coordinate detection and profile analysis concurrently on a single image
+        
+        The analysis call does not wait for coordinates; it runs speculatively
+        without coordinate context and detected title positions are merged into
+        its sections afterwards, so wall-clock time is the slower of the two calls.
+        """
+        
+        # Decode and downscale once up front; both tasks share the result
+        prepared = await self._as_prepared_async(image)
+        
+        coord_task = asyncio.create_task(self.identify_section_coordinates_async(prepared))
+        analyze_task = asyncio.create_task(self.analyze_profile_async(prepared))
+        section_coordinates, analysis = await asyncio.gather(coord_task, analyze_task)
+        
+        if analysis and section_coordinates:
+            self._merge_section_coordinates(analysis, section_coordinates)
+        
+        return section_coordinates, analysis
+    
+    async def analyze_unified(self, image):
+        """Analyze a single image with one Gemini call, falling back only as far as needed
+        
+        Sections the unified call leaves unplaced are filled in from a separate
+        coordinate detection call; both calls are re-run only when the unified
+        analysis itself fails. Returns (section_coordinates, analysis), where
+        section_coordinates is None unless separate detection ran and succeeded.
+        """
+        
+        prepared = await self._as_prepared_async(image)
+        analysis = await self.analyze_profile_unified_async(prepared)
+        section_coordinates = None
+        
+        if analysis is None:
+            # Unified call failed; retry as separate coordinate detection and analysis, run concurrently
+            print("🔍 Unified analysis failed, running coordinate detection and analysis separately...")
+            section_coordinates, analysis = await self.analyze(prepared)
+        elif not self.has_section_coordinates(analysis):
+            # Keep the analysis and only detect titles for the sections the model left unplaced
+            print("🔍 Some section positions missing, detecting section coordinates separately...")
+            section_coordinates = await self.identify_section_coordinates_async(prepared)
+            if section_coordinates:
+                self._merge_section_coordinates(analysis, section_coordinates, only_missing=True)
+        
+        return section_coordinates or None, analysis
+    
+    def _run_sync(self, coro):
+        """Run a coroutine to completion from synchronous code
+        
+        asyncio.run() refuses to start inside a running event loop (a notebook
+        or an async caller), so in that case the coroutine gets its own loop
+        on a worker thread.
+        """
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:
+            return asyncio.run(coro)
+        
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            return executor.submit(asyncio.run, coro).result()
+    
+    async def analyze_batch(self, paths, concurrency=8):
+        """Analyze many screenshots concurrently
+        
+        Each image goes through analyze_unified, so it costs a single Gemini
+        call unless a fallback is needed. At most `concurrency` images are in
+        flight at once, and Gemini calls remain capped by
+        max_concurrent_requests. Results come back in the order of `paths`; an
+        image that cannot be read or analyzed yields its exception in place of
+        a (section_coordinates, analysis) tuple instead of aborting the batch.
+        """
+        
+        semaphore = asyncio.Semaphore(concurrency)
+        
+        async def _analyze_one(path):
+            async with semaphore:
+                # Decoding and resizing is CPU-bound, keep it off the event loop
+                prepared = await asyncio.to_thread(self.prepare_image, path)
+                section_coordinates, analysis = await self.analyze_unified(prepared)
+                if analysis is None:
+                    raise RuntimeError(f"Profile analysis failed for {path}")
+                return section_coordinates, analysis
+        
+        return await asyncio.gather(*(_analyze_one(path) for path in paths), return_exceptions=True)
+    
+    def create_interactive_html(self, image, analysis, output_path):
+        """Create interactive HTML page with embedded image and scrollable hoverable comments"""
+        
+        prepared = self._as_prepared(image)
+        
+        # Stream rendered chunks to disk instead of materializing the whole document;
+        # they go to a temp file that replaces the report only once rendering finishes,
+        # so a failure never leaves a truncated report behind
+        output_path = Path(output_path)
+        chunks = _REPORT_TEMPLATE.generate(**self._report_context(prepared, analysis))
+        # A unique temp name, since concurrent processes may write reports to the same directory
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile('wb', buffering=REPORT_WRITE_BUFFER, dir=output_path.parent,
+                                             prefix=f"{output_path.name}.", suffix='.tmp', delete=False) as f:
+                tmp_path = Path(f.name)
+                f.writelines(chunk.encode('utf-8') for chunk in chunks)
+            # Temp files are created owner-only; the report is served to others
+            os.chmod(tmp_path, 0o644)
+            os.replace(tmp_path, output_path)
+        except BaseException:
+            if tmp_path:
+                tmp_path.unlink(missing_ok=True)
+            raise
         
         print(f"Interactive HTML report created: {output_path}")
         return output_path
+    
+    def _report_context(self, prepared, analysis):
+        """Collect the values the report template renders; escaping is left to the template"""
+        
+        # Safely get analysis values with defaults
+        overall_score = analysis.get('overall_score', 0)
+        
+        # Determine score class
+        if overall_score >= 85:
+            score_class = 'score-excellent'
+        elif overall_score >= 60:
+            score_class = 'score-good'
+        else:
+            score_class = 'score-poor'
+        
+        # Add statistics - Fix the type conversion issue
+        sections = analysis.get('sections', [])
+        # Sections without a criticality render as yellow buttons, so count them as yellow too
+        counts = Counter(s.get('criticality', 'yellow') for s in sections)
+        
+        # Add info buttons for each section with improved positioning and safe type conversion
+        views = [SectionView.from_dict(section, i) for i, section in enumerate(sections)]
+        buttons = []
+        tooltip_data = {}
+        
+        for i, view in enumerate(views):
+            # Use new coordinate system if available, fallback to bbox
+            coordinates = view.coordinates
+            if coordinates:
+                x_pos = float(coordinates[0]) + 3.0  # Ensure float, offset slightly to the right
+                y_pos = float(coordinates[1])
+            else:
+                # Fallback to bbox system
+                bbox = view.bbox
+                x_pos = float(bbox[2])
+                y_pos = float(bbox[1])
+            
+            # Ensure coordinates are within bounds
+            x_pos = max(0.0, min(95.0, x_pos))
+            y_pos = max(0.0, min(95.0, y_pos))
+            
+            buttons.append({
+                'criticality': view.criticality,
+                'x': f"{x_pos:.1f}",
+                'y': f"{y_pos:.1f}",
+            })
+            
+            # Convert score to string if it's a number
+            score, priority, improvements = view.score, view.priority, view.improvements
+            tooltip_data[f'tooltip-{i}'] = {
+                'name': view.name,
+                'score': str(score) if isinstance(score, (int, float)) else score,
+                'priority': str(priority) if isinstance(priority, (int, float)) else priority,
+                'comment': view.comment,
+                'detailed_analysis': view.detailed_analysis,
+                # Limit to first 5 improvements
+                'improvements': improvements[:5] if improvements else [],
+                'industry_benchmark': view.industry_benchmark,
+                'impact_on_opportunities': view.impact_on_opportunities,
+            }
+        
+        return {
+            'score_class': score_class,
+            'overall_score': overall_score,
+            'overall_feedback': analysis.get('overall_feedback', 'No feedback available'),
+            'red_count': counts.get('red', 0),
+            'yellow_count': counts.get('yellow', 0),
+            'green_count': counts.get('green', 0),
+            'total_sections': len(sections),
+            'image_src': self._report_image_src(prepared),
+            'buttons': buttons,
+            'tooltip_data': tooltip_data,
+            'summary_cards': [
+                (title, color, priority_class, analysis[key])
+                for key, title, color, priority_class in _SUMMARY_CARDS
+                if analysis.get(key)
+            ],
+        }
+    
+    def _write_json_artifact(self, path, obj):
+        """Write an analysis artifact as JSON"""
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(obj, f, **JSON_ARTIFACT_KWARGS)
+    
     def analyze_and_create_report(self, image_path, output_dir="linkedin_analysis"):
-        """Complete workflow: coordinate detection -> analysis -> interactive report"""
+        """Complete workflow: analysis with coordinate detection -> interactive report"""
         
         # Create output directory
-        os.makedirs(output_dir, exist_ok=True)
+        out = Path(output_dir)
+        out.mkdir(parents=True, exist_ok=True)
+        
+        # Read and decode the screenshot once for every step below
+        prepared = self.prepare_image(image_path)
         
-        # Step 1: Detect section coordinates
-        print("🔍 Step 1: Detecting section coordinates...")
-        section_coordinates = self.identify_section_coordinates(image_path)
+        # Step 1: Analyze the profile and locate its sections in one Gemini call
+        print("🤖 Step 1: Analyzing LinkedIn profile...")
+        section_coordinates, analysis = self._run_sync(self.analyze_unified(prepared))
         
         if section_coordinates:
             print(f"✅ Detected {len(section_coordinates.get('detected_sections', []))} sections")
-            
-            # Save coordinates for debugging
-            coords_file = os.path.join(output_dir, "detected_coordinates.json")
-            with open(coords_file, 'w') as f:
-                json.dump(section_coordinates, f, indent=2)
-            print(f"📋 Coordinates saved to: {coords_file}")
-        else:
+        elif not self.has_section_coordinates(analysis):
             print("⚠️  Coordinate detection failed, proceeding with estimated positions")
-            section_coordinates = None
-        
-        # Step 2: Analyze profile with coordinate context
-        print("🤖 Step 2: Analyzing LinkedIn profile...")
-        analysis = self.analyze_profile(image_path, section_coordinates)
         
         if not analysis:
             print("❌ Profile analysis failed")
             return None
         
-        # Save analysis JSON
-        analysis_file = os.path.join(output_dir, "analysis_results.json")
-        with open(analysis_file, 'w') as f:
-            json.dump(analysis, f, indent=2)
-        print(f"📊 Analysis saved to: {analysis_file}")
+        coords_file = out / "detected_coordinates.json"
+        analysis_file = out / "analysis_results.json"
         
-        # Step 3: Create interactive HTML report
-        print("🎨 Step 3: Creating interactive HTML report...")
-        html_output = os.path.join(output_dir, f"linkedin_analysis.html")
+        # JSON artifacts are written on worker threads while the report renders;
+        # neither step mutates the analysis, so sharing it is safe
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            artifact_writes = []
+            if section_coordinates:
+                # Save coordinates for debugging
+                artifact_writes.append(executor.submit(self._write_json_artifact, coords_file, section_coordinates))
+            artifact_writes.append(executor.submit(self._write_json_artifact, analysis_file, analysis))
+            
+            # Step 2: Create interactive HTML report
+            print("🎨 Step 2: Creating interactive HTML report...")
+            html_output = out / "linkedin_analysis.html"
+            
+            report_path = self.create_interactive_html(prepared, analysis, html_output)
+            
+            # Surface any write error from the workers
+            for write in artifact_writes:
+                write.result()
         
-        report_path = self.create_interactive_html(image_path, analysis, html_output)
+        if section_coordinates:
+            print(f"📋 Coordinates saved to: {coords_file}")
+        print(f"📊 Analysis saved to: {analysis_file}")
         
         print(f"\n🎉 Analysis Complete!")
         print(f"📁 Output Directory: {output_dir}")
         print(f"🌐 Interactive Report: {report_path}")
-        print(f"📋 Coordinates: {coords_file if section_coordinates else 'Not detected'}")
+        if section_coordinates:
+            print(f"📋 Coordinates: {coords_file}")
+        else:
+            # On the unified path the model placed the sections itself, with no separate detection file
+            located = self.located_section_count(analysis)
+            total = len(analysis.get('sections', []))
+            if located:
+                print(f"📋 Coordinates: {located}/{total} sections located by the analysis")
+            else:
+                print("📋 Coordinates: Not detected")
         print(f"📊 Raw Analysis: {analysis_file}")
         
         # Automatically open the report
         try:
-            webbrowser.open(f'file://{os.path.abspath(report_path)}')
+            import webbrowser
+            webbrowser.open(report_path.resolve().as_uri())
             print("🚀 Opening report in browser...")
         except:
             print("💡 Please manually open the HTML file in your browser")
         
+        # Paths are returned as strings, as callers have always received them
         return {
-            'html_report': report_path,
-            'analysis_json': analysis_file,
-            'coordinates_json': coords_file if section_coordinates else None,
+            'html_report': str(report_path),
+            'analysis_json': str(analysis_file),
+            'coordinates_json': str(coords_file) if section_coordinates else None,
             'section_coordinates': section_coordinates,
             'analysis': analysis
         }
@@ -1033,6 +1876,10 @@ def main():
     API_KEY = os.getenv('GEMINI_API_KEY')  # Replace with your actual API key
     IMAGE_PATH = "screenshots/linkedin.png"  # Path to your LinkedIn screenshot
     
+    # Fail fast, before the Gemini SDK is imported
+    if not API_KEY:
+        sys.exit("❌ Error: GEMINI_API_KEY is not set. Add it to your environment or .env file")
+    
     # Initialize analyzer
     analyzer = InteractiveLinkedInAnalyzer(API_KEY)
     